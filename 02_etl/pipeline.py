@@ -5,6 +5,11 @@ Extração, Transformação e Carga de dados
 
 import pandas as pd
 import numpy as np
+import polars as pl
+import polars.selectors as cs
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from datetime import datetime
 import os
 import logging
@@ -16,6 +21,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Tipos compactos para a tabela fato (a maior do modelo). Valores monetários e
+# percentuais ficam em float64: em float32 o erro por linha se acumula nas somas
+FATO_DTYPES = {
+    'ID_Venda': pl.Int32,
+    'ID_Cliente': pl.Int32,
+    'ID_Produto': pl.Int32,
+    'ID_Loja': pl.Int16,
+    'ID_Vendedor': pl.Int16,
+    'Quantidade': pl.Int32,
+    'Receita_Liquida': pl.Float64,
+    'Lucro_Bruto': pl.Float64,
+    'Desconto_Pct': pl.Float64,
+}
+
+# Linhas por row group ao gravar a fato em Parquet
+PARQUET_ROW_GROUP = 250_000
+
+
+def _categorizar(df, max_pct_unicos=0.5):
+    """Converte colunas de texto com poucos valores distintos para category"""
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        if df[col].nunique() <= max_pct_unicos * len(df):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _quintil(valores, crescente=True):
+    """Score 1-5 pelo quintil de cada valor (mesmos intervalos fechados à direita do pd.qcut)"""
+    limites = np.quantile(valores, [0.2, 0.4, 0.6, 0.8])
+    score = np.searchsorted(limites, valores, side='left').astype(np.int8) + 1
+    return score if crescente else (6 - score).astype(np.int8)
+
 
 class ETLPipeline:
     """Pipeline completo de ETL para dados de varejo"""
@@ -24,17 +61,63 @@ class ETLPipeline:
         self.input_dir = input_dir
         self.output_dir = output_dir
         
+    def _scan_polars(self, nome_arquivo, schema_overrides=None):
+        """Abre um CSV de entrada como LazyFrame do Polars, já convertendo as colunas de data"""
+        return pl.scan_csv(
+            f'{self.input_dir}/{nome_arquivo}',
+            try_parse_dates=True,
+            schema_overrides=schema_overrides
+        )
+        
+    def _salvar(self, df, nome, csv=True):
+        """Salva a tabela em Parquet (ML e API) e, se csv=True, também em CSV (Power BI)"""
+        caminho = f'{self.output_dir}/{nome}'
+        os.makedirs(self.output_dir, exist_ok=True)
+        
+        if isinstance(df, pl.LazyFrame):
+            # Gravação em streaming, sem montar um DataFrame intermediário. Uma ordenação no
+            # plano (ex.: a fato por Data_Venda em load()) ainda precisa de todas as linhas em memória.
+            # Datas vão como timestamp para o pandas ler direto como datetime64.
+            colunas_data = [col for col, tipo in df.collect_schema().items() if tipo == pl.Date]
+            df.with_columns(pl.col(colunas_data).cast(pl.Datetime('ms'))).sink_parquet(
+                f'{caminho}.parquet',
+                compression='zstd',
+                row_group_size=PARQUET_ROW_GROUP,
+                engine='streaming'
+            )
+            
+            # O CSV sai do Parquet recém-gravado, pois a entrada pode ser o próprio CSV de destino
+            if csv:
+                pl.scan_parquet(f'{caminho}.parquet').with_columns(
+                    pl.col(colunas_data).cast(pl.Date)
+                ).sink_csv(f'{caminho}.csv', engine='streaming')
+        else:
+            # Uma única conversão para Arrow serve aos dois formatos (escrita multi-thread)
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(tabela, f'{caminho}.parquet', compression='zstd')
+            if csv:
+                pacsv.write_csv(tabela, f'{caminho}.csv')
+        
     def extract(self):
         """Extrai dados dos CSVs"""
         logger.info("Iniciando extração de dados...")
         
         try:
             self.dim_tempo = pd.read_csv(f'{self.input_dir}/dim_tempo.csv', parse_dates=['Data'])
-            self.dim_produto = pd.read_csv(f'{self.input_dir}/dim_produto.csv')
-            self.dim_loja = pd.read_csv(f'{self.input_dir}/dim_loja.csv', parse_dates=['Data_Abertura'])
-            self.dim_cliente = pd.read_csv(f'{self.input_dir}/dim_cliente.csv', parse_dates=['Data_Nascimento', 'Data_Cadastro'])
-            self.dim_vendedor = pd.read_csv(f'{self.input_dir}/dim_vendedor.csv', parse_dates=['Data_Admissao'])
-            self.fato_vendas = pd.read_csv(f'{self.input_dir}/fato_vendas.csv', parse_dates=['Data_Venda'])
+            self.dim_produto = _categorizar(pd.read_csv(f'{self.input_dir}/dim_produto.csv'))
+            self.dim_loja = _categorizar(pd.read_csv(f'{self.input_dir}/dim_loja.csv', parse_dates=['Data_Abertura']))
+            self.dim_cliente = _categorizar(pd.read_csv(f'{self.input_dir}/dim_cliente.csv', parse_dates=['Data_Nascimento', 'Data_Cadastro']))
+            self.dim_vendedor = _categorizar(pd.read_csv(f'{self.input_dir}/dim_vendedor.csv', parse_dates=['Data_Admissao']))
+            
+            # A fato é lida sob demanda (em streaming) nas transformações.
+            # Colunas de texto da fato (loja, canal, etc.) têm baixa cardinalidade.
+            self.fato_vendas = (
+                self._scan_polars('fato_vendas.csv', schema_overrides=FATO_DTYPES)
+                .with_columns(cs.string().cast(pl.Categorical))
+            )
+            # A leitura é preguiçosa: o esquema (só o cabeçalho) faz um arquivo ausente ou
+            # ilegível falhar aqui na extração, e não depois nas transformações
+            self.fato_vendas.collect_schema()
             
             logger.info("✅ Dados extraídos com sucesso")
             return True
@@ -48,85 +131,121 @@ class ETLPipeline:
         logger.info("Iniciando transformações...")
         
         try:
-            # Transformações em Fato Vendas
-            self.fato_vendas['Ano'] = self.fato_vendas['Data_Venda'].dt.year
-            self.fato_vendas['Mes'] = self.fato_vendas['Data_Venda'].dt.month
-            self.fato_vendas['Dia_Semana'] = self.fato_vendas['Data_Venda'].dt.dayofweek
-            self.fato_vendas['Margem_Pct'] = (
-                (self.fato_vendas['Lucro_Bruto'] / self.fato_vendas['Receita_Liquida']) * 100
-            ).round(2)
+            # Transformações em Fato Vendas (Polars funde as colunas derivadas em uma única passada)
+            data_venda = pl.col('Data_Venda').dt
+            receita = pl.col('Receita_Liquida')
+            self.fato_vendas = self.fato_vendas.with_columns([
+                data_venda.year().cast(pl.Int16).alias('Ano'),
+                data_venda.month().cast(pl.Int8).alias('Mes'),
+                (data_venda.weekday() - 1).cast(pl.Int8).alias('Dia_Semana'),  # 0 = segunda-feira
+                pl.when(receita != 0)
+                .then((pl.col('Lucro_Bruto') / receita * 100).round(2))
+                .alias('Margem_Pct'),  # nulo quando não há receita
+            ])
             
             # Criar tabela agregada mensal
-            self.vendas_mensais = self.fato_vendas.groupby(['Ano', 'Mes']).agg({
-                'Receita_Liquida': 'sum',
-                'Lucro_Bruto': 'sum',
-                'Quantidade': 'sum',
-                'ID_Venda': 'count'
-            }).reset_index()
-            
-            self.vendas_mensais.rename(columns={'ID_Venda': 'Qtd_Vendas'}, inplace=True)
-            self.vendas_mensais['Ticket_Medio'] = (
-                self.vendas_mensais['Receita_Liquida'] / self.vendas_mensais['Qtd_Vendas']
-            ).round(2)
+            vendas_mensais = (
+                self.fato_vendas
+                .group_by(['Ano', 'Mes'])
+                .agg([
+                    pl.col('Receita_Liquida').sum().round(2),
+                    pl.col('Lucro_Bruto').sum().round(2),
+                    pl.col('Quantidade').sum(),
+                    pl.col('ID_Venda').count().alias('Qtd_Vendas'),
+                ])
+                .sort(['Ano', 'Mes'])
+                .with_columns(
+                    (pl.col('Receita_Liquida') / pl.col('Qtd_Vendas')).round(2).alias('Ticket_Medio')
+                )
+            )
             
             # Criar análise de clientes (RFM)
-            hoje = pd.Timestamp.now()
+            hoje = datetime.now()
+            
+            rfm = (
+                self.fato_vendas
+                .group_by('ID_Cliente')
+                .agg([
+                    pl.col('Data_Venda').max().alias('Ultima_Compra'),
+                    pl.col('ID_Venda').count().alias('Frequencia'),  # Frequência
+                    pl.col('Receita_Liquida').sum().round(2).alias('Monetario'),  # Monetário
+                ])
+                .select([
+                    'ID_Cliente',
+                    (pl.lit(hoje) - pl.col('Ultima_Compra').cast(pl.Datetime))
+                    .dt.total_days().cast(pl.Int32).alias('Recencia'),  # Recência
+                    'Frequencia',
+                    'Monetario',
+                ])
+                .sort('ID_Cliente')
+            )
+            
+            # Criar análise ABC de produtos
+            vendas_produto = (
+                self.fato_vendas
+                .group_by('ID_Produto')
+                .agg([
+                    pl.col('Receita_Liquida').sum().round(2),
+                    pl.col('Quantidade').sum(),
+                ])
+                .sort('Receita_Liquida', descending=True)
+                .with_columns(pl.col('Receita_Liquida').cum_sum().alias('Receita_Acumulada'))
+                .with_columns(
+                    (pl.col('Receita_Acumulada') / pl.col('Receita_Liquida').sum() * 100)
+                    .round(2).alias('Pct_Acumulado')
+                )
+            )
             
-            rfm = self.fato_vendas.groupby('ID_Cliente').agg({
-                'Data_Venda': lambda x: (hoje - x.max()).days,  # Recência
-                'ID_Venda': 'count',  # Frequência
-                'Receita_Liquida': 'sum'  # Monetário
-            }).reset_index()
+            # Agregação diária (usada pelos modelos de forecasting e anomalias)
+            vendas_diarias = (
+                self.fato_vendas
+                .group_by('Data_Venda')
+                .agg([
+                    pl.col('Receita_Liquida').sum().round(2).alias('Receita'),
+                    pl.col('Quantidade').sum(),
+                    pl.col('ID_Venda').count().alias('Num_Vendas'),
+                    pl.col('Desconto_Pct').mean().alias('Desconto_Medio'),
+                ])
+                .sort('Data_Venda')
+            )
             
-            rfm.columns = ['ID_Cliente', 'Recencia', 'Frequencia', 'Monetario']
+            # Uma única varredura em streaming da fato alimenta todas as agregações
+            self.vendas_mensais, rfm, vendas_produto, self.daily_agregado = [
+                df.to_pandas()
+                for df in pl.collect_all(
+                    [vendas_mensais, rfm, vendas_produto, vendas_diarias], engine='streaming'
+                )
+            ]
             
-            # Criar scores RFM (1-5)
-            rfm['R_Score'] = pd.qcut(rfm['Recencia'], 5, labels=[5,4,3,2,1], duplicates='drop')
-            rfm['F_Score'] = pd.qcut(rfm['Frequencia'], 5, labels=[1,2,3,4,5], duplicates='drop')
-            rfm['M_Score'] = pd.qcut(rfm['Monetario'], 5, labels=[1,2,3,4,5], duplicates='drop')
+            # Criar scores RFM (1-5) como códigos inteiros
+            rfm['R_Score'] = _quintil(rfm['Recencia'].to_numpy(), crescente=False)
+            rfm['F_Score'] = _quintil(rfm['Frequencia'].to_numpy())
+            rfm['M_Score'] = _quintil(rfm['Monetario'].to_numpy())
             
+            # Chave RFM inteira (ex.: 5-4-3 -> 543), sem montar strings por cliente
             rfm['RFM_Score'] = (
-                rfm['R_Score'].astype(str) + 
-                rfm['F_Score'].astype(str) + 
-                rfm['M_Score'].astype(str)
+                rfm['R_Score'].astype('int16') * 100 +
+                rfm['F_Score'].astype('int16') * 10 +
+                rfm['M_Score'].astype('int16')
             )
             
             # Segmentar clientes
-            def segment_customer(score):
-                if score[0] in ['4', '5'] and score[1] in ['4', '5']:
-                    return 'Champions'
-                elif score[0] in ['3', '4', '5'] and score[1] in ['3', '4']:
-                    return 'Leais'
-                elif score[0] in ['4', '5'] and score[1] in ['1', '2']:
-                    return 'Potencial'
-                elif score[0] in ['2', '3'] and score[1] in ['2', '3', '4']:
-                    return 'Em Risco'
-                else:
-                    return 'Perdidos'
-            
-            rfm['Segmento_RFM'] = rfm['RFM_Score'].apply(segment_customer)
+            r = rfm['R_Score'].to_numpy()
+            f = rfm['F_Score'].to_numpy()
+            condicoes = [
+                (r >= 4) & (f >= 4),
+                (r >= 3) & (f >= 3) & (f <= 4),
+                (r >= 4) & (f <= 2),
+                (r >= 2) & (r <= 3) & (f >= 2) & (f <= 4),
+            ]
+            segmentos = ['Champions', 'Leais', 'Potencial', 'Em Risco']
+            rfm['Segmento_RFM'] = np.select(condicoes, segmentos, default='Perdidos')
             self.rfm_clientes = rfm
             
-            # Criar análise ABC de produtos
-            vendas_produto = self.fato_vendas.groupby('ID_Produto').agg({
-                'Receita_Liquida': 'sum',
-                'Quantidade': 'sum'
-            }).reset_index()
-            
-            vendas_produto = vendas_produto.sort_values('Receita_Liquida', ascending=False)
-            vendas_produto['Receita_Acumulada'] = vendas_produto['Receita_Liquida'].cumsum()
-            total_receita = vendas_produto['Receita_Liquida'].sum()
-            vendas_produto['Pct_Acumulado'] = (vendas_produto['Receita_Acumulada'] / total_receita * 100).round(2)
-            
-            def classificar_abc(pct):
-                if pct <= 80:
-                    return 'A'
-                elif pct <= 95:
-                    return 'B'
-                else:
-                    return 'C'
-            
-            vendas_produto['Classe_ABC'] = vendas_produto['Pct_Acumulado'].apply(classificar_abc)
+            # Código da classe sem desvios: 0 = A, 1 = B, 2 = C
+            pct = vendas_produto['Pct_Acumulado'].to_numpy()
+            codigo_abc = (pct > 80).astype(np.int8) + (pct > 95)
+            vendas_produto['Classe_ABC'] = np.array(['A', 'B', 'C'])[codigo_abc]
             self.abc_produtos = vendas_produto
             
             logger.info("✅ Transformações aplicadas com sucesso")
@@ -142,12 +261,15 @@ class ETLPipeline:
         
         try:
             # Salvar tabelas agregadas
-            self.vendas_mensais.to_csv(f'{self.output_dir}/vendas_mensais.csv', index=False)
-            self.rfm_clientes.to_csv(f'{self.output_dir}/rfm_clientes.csv', index=False)
-            self.abc_produtos.to_csv(f'{self.output_dir}/abc_produtos.csv', index=False)
+            self._salvar(self.vendas_mensais, 'vendas_mensais')
+            self._salvar(self.rfm_clientes, 'rfm_clientes')
+            self._salvar(self.abc_produtos, 'abc_produtos')
+            self._salvar(self.daily_agregado, 'daily_agregado', csv=False)  # cache do ML
+            self._salvar(self.dim_produto, 'dim_produto', csv=False)  # leitura tipada pela API
             
-            # Atualizar fato vendas com campos derivados
-            self.fato_vendas.to_csv(f'{self.output_dir}/fato_vendas.csv', index=False)
+            # Atualizar fato vendas com campos derivados, em ordem de data: cada row group
+            # do Parquet cobre um intervalo contíguo e filtros por período pulam os demais
+            self._salvar(self.fato_vendas.sort('Data_Venda', maintain_order=True), 'fato_vendas')
             
             logger.info("✅ Dados carregados com sucesso")
             
@@ -158,6 +280,7 @@ class ETLPipeline:
             print(f"Vendas Mensais: {len(self.vendas_mensais)} registros")
             print(f"Clientes RFM: {len(self.rfm_clientes)} registros")
             print(f"Produtos ABC: {len(self.abc_produtos)} registros")
+            print(f"Vendas Diárias: {len(self.daily_agregado)} registros")
             print("\nDistribuição ABC de Produtos:")
             print(self.abc_produtos['Classe_ABC'].value_counts())
             print("\nSegmentação RFM de Clientes:")
@@ -187,6 +310,11 @@ class ETLPipeline:
         return True
 
 
-if __name__ == "__main__":
+def main():
+    """Ponto de entrada do ETL (também chamado em processo pelo run_pipeline.py)"""
     pipeline = ETLPipeline()
-    pipeline.run()
+    return pipeline.run()
+
+
+if __name__ == "__main__":
+    main()
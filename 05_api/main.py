@@ -3,20 +3,192 @@ API FastAPI para Sistema BI Varejo
 Endpoints para KPIs, dados e previsões
 """
 
+from contextlib import asynccontextmanager
+from functools import lru_cache, wraps
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, date, timedelta
-import pandas as pd
+import polars as pl
 import numpy as np
+import orjson
 import os
 
+# Diretório de dados
+DATA_DIR = "01_data/processed"
+
+# Dados em memória, lidos na inicialização (ou no primeiro uso) e relidos quando os
+# Parquet mudam no disco. Cada worker do uvicorn tem a sua cópia
+DATA = {}
+
+# Última recarga que falhou (versão dos arquivos e erro): a mesma versão não é relida
+# a cada requisição, só quando os Parquet mudarem de novo
+FALHA_RECARGA = {}
+
+# Consultas com resposta memorizada; o cache é limpo a cada recarga dos dados
+CONSULTAS_EM_CACHE = []
+
+# Colunas lidas de cada tabela (apenas as usadas pelos endpoints)
+COLUNAS = {
+    "fato_vendas": ['Data_Venda', 'ID_Venda', 'ID_Cliente', 'ID_Produto', 'Quantidade',
+                    'Receita_Liquida', 'Lucro_Bruto'],
+    "dim_produto": ['ID_Produto', 'Nome_Produto', 'Categoria'],
+    "rfm_clientes": ['ID_Cliente', 'Segmento_RFM'],
+    "vendas_mensais": ['Ano', 'Mes', 'Receita_Liquida', 'Lucro_Bruto', 'Qtd_Vendas', 'Ticket_Medio'],
+}
+
+# Tipos em memória: IDs e contagens em 32 bits ou menos, textos repetidos como Categorical.
+# Valores monetários ficam em float64, que guarda os centavos exatos para as somas
+TIPOS = {
+    "fato_vendas": {'Data_Venda': pl.Date, 'ID_Venda': pl.Int32, 'ID_Cliente': pl.Int32,
+                    'ID_Produto': pl.Int32, 'Quantidade': pl.Int32,
+                    'Receita_Liquida': pl.Float64, 'Lucro_Bruto': pl.Float64},
+    "dim_produto": {'ID_Produto': pl.Int32, 'Categoria': pl.Categorical},
+    "rfm_clientes": {'ID_Cliente': pl.Int32, 'Segmento_RFM': pl.Categorical},
+    "vendas_mensais": {'Ano': pl.Int16, 'Mes': pl.Int8, 'Qtd_Vendas': pl.Int32},
+}
+
+def ler_parquet(tabela):
+    """Lê uma tabela processada em Parquet, somente com as colunas usadas pela API e tipada"""
+    return pl.read_parquet(f'{DATA_DIR}/{tabela}.parquet', columns=COLUNAS[tabela]).cast(TIPOS[tabela])
+
+def calcular_kpis_diarios(fato_vendas):
+    """Totais por dia ordenados por data: vendas diárias e KPIs de qualquer período
+    saem de fatias localizadas por busca binária (intervalo_dias)"""
+    diario = fato_vendas.group_by('Data_Venda').agg(
+        Receita=pl.col('Receita_Liquida').sum(),
+        Lucro=pl.col('Lucro_Bruto').sum(),
+        Vendas=pl.len().cast(pl.Int64),
+        Clientes=pl.col('ID_Cliente').unique(),
+        Num_Clientes=pl.col('ID_Cliente').n_unique().cast(pl.Int64)
+    ).sort('Data_Venda')
+    
+    # Acumulados com um zero à frente: a soma dos dias [i, j) é acum[j] - acum[i]
+    kpis = {col: np.concatenate(([0], diario[col].to_numpy().cumsum()))
+            for col in ['Receita', 'Lucro', 'Vendas', 'Num_Clientes']}
+    kpis['datas'] = diario['Data_Venda'].to_numpy()
+    
+    # Linhas de /vendas/diarias prontas para a resposta
+    kpis['diario'] = diario.select(
+        Data=pl.col('Data_Venda').dt.to_string('%Y-%m-%d'),
+        Receita='Receita',
+        Lucro='Lucro',
+        Qtd_Vendas='Vendas'
+    )
+    
+    # Clientes distintos não são somáveis: guarda os IDs únicos de cada dia em sequência,
+    # e os dias [i, j) ocupam clientes[Num_Clientes[i]:Num_Clientes[j]] (acumulado)
+    kpis['clientes'] = diario['Clientes'].explode().to_numpy()
+    kpis['total_clientes'] = fato_vendas['ID_Cliente'].n_unique()
+    return kpis
+
+def intervalo_dias(datas, data_inicio=None, data_fim=None):
+    """Posições [inicio, fim) do período (datas já validadas pelo FastAPI) nas datas ordenadas dos acumulados"""
+    inicio = np.searchsorted(datas, np.datetime64(data_inicio)) if data_inicio else 0
+    fim = np.searchsorted(datas, np.datetime64(data_fim), side='right') if data_fim else len(datas)
+    return inicio, max(inicio, fim)
+
+def clientes_distintos(kpis, inicio, fim):
+    """Clientes distintos nos dias [inicio, fim): união dos IDs únicos de cada dia"""
+    clientes = kpis['clientes'][kpis['Num_Clientes'][inicio]:kpis['Num_Clientes'][fim]]
+    return int(np.unique(clientes).size)
+
+def calcular_top_produtos(fato_vendas, dim_produto):
+    """Ranking completo de produtos por receita, já com os campos de ProdutoTop"""
+    vendas_produto = fato_vendas.lazy().group_by('ID_Produto').agg(
+        pl.col('Receita_Liquida').sum(),
+        pl.col('Quantidade').sum()
+    )
+    
+    # Join com dimensão produto, ordenado uma única vez
+    return vendas_produto.join(dim_produto.lazy(), on='ID_Produto').sort(
+        'Receita_Liquida', descending=True, maintain_order=True
+    ).select(
+        id_produto='ID_Produto',
+        nome_produto='Nome_Produto',
+        categoria=pl.col('Categoria').cast(pl.String),
+        receita='Receita_Liquida',
+        quantidade='Quantidade'
+    ).collect()
+
+def calcular_segmentos(fato_vendas, rfm_clientes):
+    """Estatísticas por segmento RFM, já com os campos de ClienteSegmento (None sem segmentação)"""
+    if 'Segmento_RFM' not in rfm_clientes.columns:
+        return None
+    
+    # Receita e frequência por cliente: um índice por cliente e somas por bincount, sem group_by
+    clientes, indice = np.unique(fato_vendas['ID_Cliente'].to_numpy(), return_inverse=True)
+    receita_cliente = np.bincount(indice, weights=fato_vendas['Receita_Liquida'].to_numpy())
+    frequencia_cliente = np.bincount(indice)
+    
+    # Alinhar com o RFM pelo ID (clientes está ordenado); clientes sem venda ficam de fora
+    rfm_ids = rfm_clientes['ID_Cliente'].to_numpy()
+    pos = np.minimum(np.searchsorted(clientes, rfm_ids), len(clientes) - 1)
+    com_venda = clientes[pos] == rfm_ids if len(clientes) else np.zeros(len(rfm_ids), dtype=bool)
+    pos = pos[com_venda]
+    
+    # Médias por segmento numa passada: contagem e somas ponderadas pelo índice do segmento
+    segmentos, indice_seg = np.unique(
+        rfm_clientes['Segmento_RFM'].cast(pl.String).to_numpy()[com_venda], return_inverse=True
+    )
+    qtd_clientes = np.bincount(indice_seg, minlength=len(segmentos))
+    
+    return pl.DataFrame({
+        'segmento': segmentos.astype(str),
+        'qtd_clientes': qtd_clientes,
+        'receita_media': np.bincount(indice_seg, weights=receita_cliente[pos], minlength=len(segmentos)) / qtd_clientes,
+        'frequencia_media': np.bincount(indice_seg, weights=frequencia_cliente[pos], minlength=len(segmentos)) / qtd_clientes,
+    })
+
+def versao_arquivos():
+    """Data de modificação dos Parquet lidos pela API (muda quando o ETL regrava os dados)"""
+    return tuple(os.stat(f'{DATA_DIR}/{tabela}.parquet').st_mtime_ns for tabela in COLUNAS)
+
+def recarregar_dados():
+    """Lê os dados processados do disco e substitui o cache em memória"""
+    # Versão lida antes dos arquivos: uma gravação durante a leitura provoca nova recarga
+    versao = versao_arquivos()
+    
+    # A fato só alimenta os agregados abaixo: nenhuma requisição a lê, então não fica em memória
+    fato_vendas = ler_parquet('fato_vendas')
+    dados = {
+        "dim": ler_parquet('dim_produto'),
+        "rfm": ler_parquet('rfm_clientes'),
+        "mensal": ler_parquet('vendas_mensais'),
+    }
+    # Categoria como Enum: a lista de categorias fica no próprio dtype
+    categorias = dados["dim"]['Categoria'].drop_nulls().unique(maintain_order=True).cast(pl.String)
+    dados["dim"] = dados["dim"].with_columns(pl.col('Categoria').cast(pl.Enum(categorias)))
+    
+    # Agregados estáticos entre recargas, calculados uma vez
+    dados["kpis_diarios"] = calcular_kpis_diarios(fato_vendas)
+    dados["top_produtos"] = calcular_top_produtos(fato_vendas, dados["dim"])
+    dados["segmentos"] = calcular_segmentos(fato_vendas, dados["rfm"])
+    dados["versao"] = versao
+    DATA.update(dados)
+    
+    for consulta in CONSULTAS_EM_CACHE:
+        consulta.cache_clear()
+
+@asynccontextmanager
+async def lifespan(app):
+    """Carrega os dados na inicialização da API"""
+    try:
+        recarregar_dados()
+    except Exception as e:
+        # A API sobe mesmo sem dados; os endpoints tentam carregar no primeiro uso
+        print(f"⚠️  Dados não carregados na inicialização: {str(e)}")
+    yield
+
 app = FastAPI(
     title="API BI Varejo",
     description="API REST para Sistema de Business Intelligence de Varejo",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS
@@ -28,10 +200,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Diretório de dados
-DATA_DIR = "01_data/processed"
+# Compressão gzip para respostas a partir de 1 KB (ex.: /vendas/diarias em períodos longos)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 # ==================== MODELOS PYDANTIC ====================
+# Documentam as respostas no OpenAPI; os endpoints devolvem dicts já com esses campos
+# e tipos, serializados direto pelo orjson (sem revalidar cada linha)
 
 class KPIResponse(BaseModel):
     receita_total: float
@@ -65,16 +239,54 @@ class ClienteSegmento(BaseModel):
 # ==================== FUNÇÕES AUXILIARES ====================
 
 def carregar_dados():
-    """Carrega dados dos CSVs"""
+    """Retorna as dimensões e tabelas agregadas em memória, relendo o disco se os Parquet mudaram.
+    
+    A checagem (um stat por arquivo) faz cada worker pegar os dados novos na próxima
+    requisição, sem depender de qual deles recebeu o POST /admin/reload. Se a releitura
+    falhar, os dados anteriores continuam valendo até os arquivos mudarem outra vez.
+    """
     try:
-        fato_vendas = pd.read_csv(f'{DATA_DIR}/fato_vendas.csv', parse_dates=['Data_Venda'])
-        dim_produto = pd.read_csv(f'{DATA_DIR}/dim_produto.csv')
-        rfm_clientes = pd.read_csv(f'{DATA_DIR}/rfm_clientes.csv')
-        vendas_mensais = pd.read_csv(f'{DATA_DIR}/vendas_mensais.csv')
-        
-        return fato_vendas, dim_produto, rfm_clientes, vendas_mensais
+        versao = versao_arquivos()
+        if versao != DATA.get("versao") and versao != FALHA_RECARGA.get("versao"):
+            try:
+                recarregar_dados()
+            except Exception as e:
+                FALHA_RECARGA.update(versao=versao, erro=str(e))
+                raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao carregar dados: {str(e)}")
+        if not DATA:
+            raise HTTPException(status_code=500, detail=f"Erro ao carregar dados: {str(e)}")
+        # Ex.: ETL ainda gravando ou recriando o diretório; segue com os dados anteriores
+        print(f"⚠️  Recarga adiada, usando dados anteriores: {str(e)}")
+    
+    if not DATA:
+        raise HTTPException(status_code=500, detail=f"Erro ao carregar dados: {FALHA_RECARGA['erro']}")
+    return DATA["dim"], DATA["rfm"], DATA["mensal"]
+
+def json_em_lotes(tabela, tamanho_lote=1000):
+    """Serializa uma tabela Arrow como array JSON, um lote de linhas por vez"""
+    yield b'['
+    separador = b''
+    for lote in tabela.to_batches(max_chunksize=tamanho_lote):
+        if lote.num_rows:
+            # orjson serializa o lote inteiro; os colchetes são removidos para emendar os lotes
+            yield separador + orjson.dumps(lote.to_pylist())[1:-1]
+            separador = b','
+    yield b']'
+
+def em_cache(consulta):
+    """Memoriza a resposta da consulta por parâmetros até a próxima recarga dos dados"""
+    memorizada = lru_cache(maxsize=256)(consulta)
+    CONSULTAS_EM_CACHE.append(memorizada)
+    
+    @wraps(consulta)
+    def consultar(*args):
+        # Checa a versão dos dados antes do cache: uma recarga limpa as respostas memorizadas,
+        # então as consultas memorizadas já encontram DATA carregado
+        carregar_dados()
+        return memorizada(*args)
+    
+    return consultar
 
 # ==================== ENDPOINTS ====================
 
@@ -91,7 +303,8 @@ async def root():
             "/produtos/top": "Top produtos por receita",
             "/clientes/segmentos": "Segmentação de clientes",
             "/forecast": "Previsão de vendas",
-            "/health": "Status da API"
+            "/health": "Status da API",
+            "/admin/reload": "Recarrega os dados do disco (POST)"
         }
     }
 
@@ -100,10 +313,47 @@ async def health_check():
     """Verifica saúde da API"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
-@app.get("/kpis", response_model=KPIResponse)
+@app.post("/admin/reload")
+async def reload_data():
+    """Força a releitura dos dados neste worker (os demais detectam Parquet novos sozinhos)"""
+    try:
+        recarregar_dados()
+        return {"status": "reloaded", "timestamp": datetime.now().isoformat()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao carregar dados: {str(e)}")
+
+@em_cache
+def consultar_kpis(data_inicio, data_fim):
+    """Calcula os KPIs do período"""
+    kpis = DATA["kpis_diarios"]
+    
+    # Totais do período pela diferença dos acumulados diários
+    inicio, fim = intervalo_dias(kpis['datas'], data_inicio, data_fim)
+    receita_total = float(kpis['Receita'][fim] - kpis['Receita'][inicio])
+    lucro_bruto = float(kpis['Lucro'][fim] - kpis['Lucro'][inicio])
+    total_vendas = int(kpis['Vendas'][fim] - kpis['Vendas'][inicio])
+    margem_bruta_pct = (lucro_bruto / receita_total * 100) if receita_total > 0 else 0.0
+    ticket_medio = receita_total / total_vendas if total_vendas > 0 else 0.0
+    
+    # Clientes distintos: sem filtro, o total pré-calculado; com filtro, os dias do período
+    if data_inicio or data_fim:
+        total_clientes = clientes_distintos(kpis, inicio, fim)
+    else:
+        total_clientes = kpis['total_clientes']
+    
+    return {
+        "receita_total": round(receita_total, 2),
+        "lucro_bruto": round(lucro_bruto, 2),
+        "margem_bruta_pct": round(margem_bruta_pct, 2),
+        "ticket_medio": round(ticket_medio, 2),
+        "total_vendas": total_vendas,
+        "total_clientes": total_clientes
+    }
+
+@app.get("/kpis", responses={200: {"model": KPIResponse}})
 async def get_kpis(
-    data_inicio: Optional[str] = None,
-    data_fim: Optional[str] = None
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None
 ):
     """
     Retorna KPIs principais do negócio
@@ -113,35 +363,11 @@ async def get_kpis(
     - data_fim: Data final (formato YYYY-MM-DD)
     """
     try:
-        fato_vendas, _, _, _ = carregar_dados()
-        
-        # Filtrar por data se fornecido
-        if data_inicio:
-            fato_vendas = fato_vendas[fato_vendas['Data_Venda'] >= data_inicio]
-        if data_fim:
-            fato_vendas = fato_vendas[fato_vendas['Data_Venda'] <= data_fim]
-        
-        # Calcular KPIs
-        receita_total = float(fato_vendas['Receita_Liquida'].sum())
-        lucro_bruto = float(fato_vendas['Lucro_Bruto'].sum())
-        margem_bruta_pct = (lucro_bruto / receita_total * 100) if receita_total > 0 else 0
-        ticket_medio = float(fato_vendas['Receita_Liquida'].mean())
-        total_vendas = int(len(fato_vendas))
-        total_clientes = int(fato_vendas['ID_Cliente'].nunique())
-        
-        return KPIResponse(
-            receita_total=round(receita_total, 2),
-            lucro_bruto=round(lucro_bruto, 2),
-            margem_bruta_pct=round(margem_bruta_pct, 2),
-            ticket_medio=round(ticket_medio, 2),
-            total_vendas=total_vendas,
-            total_clientes=total_clientes
-        )
-        
+        return ORJSONResponse(consultar_kpis(data_inicio, data_fim))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/vendas/mensais", response_model=List[VendaMensal])
+@app.get("/vendas/mensais", responses={200: {"model": List[VendaMensal]}})
 async def get_vendas_mensais(
     ano: Optional[int] = None,
     limit: int = Query(default=12, le=100)
@@ -154,30 +380,38 @@ async def get_vendas_mensais(
     - limit: Número máximo de meses a retornar
     """
     try:
-        _, _, _, vendas_mensais = carregar_dados()
+        _, _, vendas_mensais = carregar_dados()
         
         if ano:
-            vendas_mensais = vendas_mensais[vendas_mensais['Ano'] == ano]
+            vendas_mensais = vendas_mensais.filter(pl.col('Ano') == ano)
         
-        vendas_mensais = vendas_mensais.sort_values(['Ano', 'Mes'], ascending=False).head(limit)
-        
-        resultado = []
-        for _, row in vendas_mensais.iterrows():
-            resultado.append(VendaMensal(
-                ano=int(row['Ano']),
-                mes=int(row['Mes']),
-                receita=float(row['Receita_Liquida']),
-                lucro=float(row['Lucro_Bruto']),
-                qtd_vendas=int(row['Qtd_Vendas']),
-                ticket_medio=float(row['Ticket_Medio'])
-            ))
+        vendas_mensais = vendas_mensais.sort(['Ano', 'Mes'], descending=True).head(limit).select(
+            ano='Ano',
+            mes='Mes',
+            receita='Receita_Liquida',
+            lucro='Lucro_Bruto',
+            qtd_vendas='Qtd_Vendas',
+            ticket_medio='Ticket_Medio'
+        )
         
-        return resultado
+        # Colunas já com os nomes e tipos de VendaMensal
+        return ORJSONResponse(vendas_mensais.to_dicts())
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/produtos/top", response_model=List[ProdutoTop])
+@em_cache
+def consultar_top_produtos(limit, categoria):
+    """Recorta o ranking de produtos pré-calculado (tupla: o resultado é compartilhado pelo cache)"""
+    vendas_produto = DATA["top_produtos"]
+    
+    # Filtrar por categoria se fornecido; o ranking já está ordenado por receita
+    if categoria:
+        vendas_produto = vendas_produto.filter(pl.col('categoria') == categoria)
+    
+    return tuple(vendas_produto.head(limit).to_dicts())
+
+@app.get("/produtos/top", responses={200: {"model": List[ProdutoTop]}})
 async def get_top_produtos(
     limit: int = Query(default=10, le=100),
     categoria: Optional[str] = None
@@ -190,86 +424,33 @@ async def get_top_produtos(
     - categoria: Filtrar por categoria específica
     """
     try:
-        fato_vendas, dim_produto, _, _ = carregar_dados()
-        
-        # Agregar vendas por produto
-        vendas_produto = fato_vendas.groupby('ID_Produto').agg({
-            'Receita_Liquida': 'sum',
-            'Quantidade': 'sum'
-        }).reset_index()
-        
-        # Merge com dimensão produto
-        vendas_produto = vendas_produto.merge(dim_produto, on='ID_Produto')
-        
-        # Filtrar por categoria se fornecido
-        if categoria:
-            vendas_produto = vendas_produto[vendas_produto['Categoria'] == categoria]
-        
-        # Ordenar e limitar
-        vendas_produto = vendas_produto.sort_values('Receita_Liquida', ascending=False).head(limit)
-        
-        resultado = []
-        for _, row in vendas_produto.iterrows():
-            resultado.append(ProdutoTop(
-                id_produto=int(row['ID_Produto']),
-                nome_produto=str(row['Nome_Produto']),
-                categoria=str(row['Categoria']),
-                receita=float(row['Receita_Liquida']),
-                quantidade=int(row['Quantidade'])
-            ))
-        
-        return resultado
-        
+        return ORJSONResponse(consultar_top_produtos(limit, categoria))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/clientes/segmentos", response_model=List[ClienteSegmento])
+@em_cache
+def consultar_segmentos():
+    """Monta as estatísticas por segmento RFM pré-calculadas"""
+    segmentos = DATA["segmentos"]
+    
+    if segmentos is None:
+        # Retornar vazio se não houver segmentação
+        return ()
+    
+    return tuple(segmentos.to_dicts())
+
+@app.get("/clientes/segmentos", responses={200: {"model": List[ClienteSegmento]}})
 async def get_segmentos_clientes():
     """Retorna análise de segmentação de clientes (RFM)"""
     try:
-        fato_vendas, _, rfm_clientes, _ = carregar_dados()
-        
-        # Calcular estatísticas por segmento
-        vendas_cliente = fato_vendas.groupby('ID_Cliente').agg({
-            'Receita_Liquida': 'sum',
-            'ID_Venda': 'count'
-        }).reset_index()
-        
-        vendas_cliente.columns = ['ID_Cliente', 'Receita_Total', 'Frequencia']
-        
-        # Merge com RFM
-        if 'Segmento_RFM' in rfm_clientes.columns:
-            rfm_vendas = rfm_clientes.merge(vendas_cliente, on='ID_Cliente')
-            
-            segmentos = rfm_vendas.groupby('Segmento_RFM').agg({
-                'ID_Cliente': 'count',
-                'Receita_Total': 'mean',
-                'Frequencia': 'mean'
-            }).reset_index()
-            
-            segmentos.columns = ['Segmento', 'Qtd_Clientes', 'Receita_Media', 'Frequencia_Media']
-            
-            resultado = []
-            for _, row in segmentos.iterrows():
-                resultado.append(ClienteSegmento(
-                    segmento=str(row['Segmento']),
-                    qtd_clientes=int(row['Qtd_Clientes']),
-                    receita_media=float(row['Receita_Media']),
-                    frequencia_media=float(row['Frequencia_Media'])
-                ))
-            
-            return resultado
-        else:
-            # Retornar vazio se não houver segmentação
-            return []
-        
+        return ORJSONResponse(consultar_segmentos())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/vendas/diarias")
 async def get_vendas_diarias(
-    data_inicio: str,
-    data_fim: str
+    data_inicio: date,
+    data_fim: date
 ):
     """
     Retorna vendas agregadas por dia
@@ -279,43 +460,32 @@ async def get_vendas_diarias(
     - data_fim: Data final (YYYY-MM-DD)
     """
     try:
-        fato_vendas, _, _, _ = carregar_dados()
+        carregar_dados()
+        kpis = DATA["kpis_diarios"]
         
-        # Filtrar por período
-        mask = (fato_vendas['Data_Venda'] >= data_inicio) & (fato_vendas['Data_Venda'] <= data_fim)
-        vendas_periodo = fato_vendas[mask]
+        # Período localizado por busca binária nos dias ordenados: fatia contígua, sem varrer a fato
+        inicio, fim = intervalo_dias(kpis['datas'], data_inicio, data_fim)
+        vendas_diarias = kpis['diario'].slice(inicio, fim - inicio)
         
-        # Agregar por dia
-        vendas_diarias = vendas_periodo.groupby('Data_Venda').agg({
-            'Receita_Liquida': 'sum',
-            'Lucro_Bruto': 'sum',
-            'ID_Venda': 'count'
-        }).reset_index()
-        
-        vendas_diarias.columns = ['Data', 'Receita', 'Lucro', 'Qtd_Vendas']
-        
-        # Converter para JSON serializável
-        resultado = vendas_diarias.to_dict(orient='records')
-        
-        # Converter datas para string
-        for item in resultado:
-            item['Data'] = str(item['Data'])[:10]
-        
-        return JSONResponse(content=resultado)
+        # Enviada em lotes conforme é serializada, sem montar a lista completa de dicts
+        return StreamingResponse(json_em_lotes(vendas_diarias.to_arrow()), media_type="application/json")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@em_cache
+def consultar_categorias():
+    """Lista as categorias de produtos"""
+    # Leitura dos metadados do Enum, sem percorrer a coluna
+    categorias = DATA["dim"]['Categoria'].dtype.categories.to_list()
+    
+    return {"categorias": tuple(categorias)}
+
 @app.get("/categorias")
 async def get_categorias():
     """Retorna lista de categorias de produtos"""
     try:
-        _, dim_produto, _, _ = carregar_dados()
-        
-        categorias = dim_produto['Categoria'].unique().tolist()
-        
-        return {"categorias": categorias}
-        
+        return consultar_categorias()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -328,7 +498,22 @@ if __name__ == "__main__":
     print("🚀 Iniciando API BI Varejo")
     print("="*60)
     print("📍 URL: http://localhost:8000")
+    workers = int(os.environ.get("API_WORKERS", os.cpu_count() or 1))
+    
     print("📚 Docs: http://localhost:8000/docs")
+    print(f"⚙️  Workers: {workers}")
     print("="*60)
     
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    # Vários processos (cada um carrega os dados uma vez no lifespan) e sem reload, que
+    # impede workers. loop/http "auto" usam uvloop e httptools quando instalados
+    # (uvicorn[standard]) e caem para asyncio/h11 onde não existem (ex.: Windows)
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        reload=False,
+        loop="auto",
+        http="auto"
+    )
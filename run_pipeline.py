@@ -5,8 +5,13 @@ Executa todo o pipeline: Geração de Dados -> ETL -> ML -> API
 """
 
 import os
+import re
+import ast
 import sys
-import subprocess
+import runpy
+import importlib.util
+from importlib.metadata import distributions
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
 def print_header(title):
@@ -15,28 +20,99 @@ def print_header(title):
     print(f"  {title}")
     print("="*70 + "\n")
 
-def run_step(description, script_path, python_path="python"):
-    """Executa um passo do pipeline"""
+def has_main(script_path):
+    """Verifica, sem executar o script, se ele define uma função main() no nível do módulo"""
+    with open(script_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=script_path)
+    return any(isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == 'main'
+               for node in tree.body)
+
+def load_entrypoint(script_path):
+    """Carrega o script como módulo e retorna sua função main().
+    
+    Scripts sem main() (apenas com o bloco if __name__ == "__main__") são executados
+    uma única vez como __main__ via runpy, como se fossem chamados pela linha de comando.
+    """
+    if not has_main(script_path):
+        return lambda: runpy.run_path(script_path, run_name="__main__")
+    
+    module_name = os.path.splitext(os.path.basename(script_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.main
+
+def run_step(description, script_path):
+    """Executa um passo do pipeline no próprio processo (sem novo interpretador)"""
     print(f"🚀 {description}...")
     print(f"   Executando: {script_path}")
     print("-" * 70)
     
+    # Pasta do script no sys.path durante o passo, como no subprocesso (imports de módulos vizinhos)
+    script_dir = os.path.dirname(os.path.abspath(script_path))
+    sys.path.insert(0, script_dir)
+    
     try:
-        result = subprocess.run(
-            [python_path, script_path],
-            check=True,
-            capture_output=False,
-            text=True
-        )
+        # main() retornando False indica falha; None é tratado como sucesso
+        if load_entrypoint(script_path)() is False:
+            print(f"❌ {description} - ERRO")
+            return False
         print(f"✅ {description} - CONCLUÍDO\n")
         return True
-    except subprocess.CalledProcessError as e:
+    except SystemExit as e:
+        # sys.exit() / sys.exit(0) no script é término normal, como no subprocesso
+        if e.code in (None, 0):
+            print(f"✅ {description} - CONCLUÍDO\n")
+            return True
         print(f"❌ {description} - ERRO")
-        print(f"   Código de saída: {e.returncode}")
+        print(f"   Código de saída: {e.code}")
         return False
     except Exception as e:
         print(f"❌ {description} - ERRO: {str(e)}")
         return False
+    finally:
+        sys.path.remove(script_dir)
+
+def run_steps(steps, max_workers=2):
+    """Executa os passos como um DAG: cada passo inicia quando suas dependências concluem,
+    e passos independentes rodam em paralelo. Retorna a quantidade de passos concluídos."""
+    pending = dict(steps)
+    running = {}
+    done, failed = set(), set()
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Submeter os passos liberados (ou pular os que dependem de um passo que falhou)
+            for step_id, step in list(pending.items()):
+                if any(dep in failed for dep in step['depends']):
+                    print(f"\n⚠️  {step['description']} - PULADO (dependência falhou)")
+                    failed.add(step_id)
+                    del pending[step_id]
+                elif all(dep in done for dep in step['depends']):
+                    print_header(f"{step['description']}")
+                    running[executor.submit(run_step, step['description'], step['script'])] = step_id
+                    del pending[step_id]
+            
+            if not running:
+                break
+            
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step_id = running.pop(future)
+                if future.result():
+                    done.add(step_id)
+                elif steps[step_id]['required']:
+                    print("\n❌ Pipeline interrompido devido a erro crítico")
+                    sys.exit(1)
+                else:
+                    failed.add(step_id)
+                    print("\n⚠️  Passo opcional falhou - continuando...")
+    
+    return len(done)
+
+def normalize_name(name):
+    """Normaliza o nome de distribuição como o pip (Faker == faker, scikit_learn == scikit-learn)"""
+    return re.sub(r'[-_.]+', '-', name).lower()
 
 def check_dependencies():
     """Verifica se as dependências estão instaladas"""
@@ -45,22 +121,39 @@ def check_dependencies():
     required_packages = [
         'pandas',
         'numpy',
+        'polars',
+        'pyarrow',
         'faker',
         'scikit-learn',
         'fastapi',
-        'uvicorn'
+        'uvicorn',
+        'orjson'
     ]
     
+    # Usados apenas pela previsão com Prophet; o treino segue sem eles
+    optional_packages = [
+        'prophet',
+        'cmdstanpy'
+    ]
+    
+    # Consulta apenas os metadados instalados (.dist-info), sem importar os pacotes
+    installed = {normalize_name(dist.metadata['Name']) for dist in distributions() if dist.metadata['Name']}
+    
     missing = []
     
     for package in required_packages:
-        try:
-            __import__(package)
+        if normalize_name(package) in installed:
             print(f"✅ {package}")
-        except ImportError:
+        else:
             print(f"❌ {package} - NÃO INSTALADO")
             missing.append(package)
     
+    for package in optional_packages:
+        if normalize_name(package) in installed:
+            print(f"✅ {package}")
+        else:
+            print(f"⚠️  {package} - NÃO INSTALADO (opcional)")
+    
     if missing:
         print(f"\n⚠️  Pacotes faltando: {', '.join(missing)}")
         print("   Execute: pip install -r requirements.txt")
@@ -83,38 +176,30 @@ def main():
         print("\n❌ Pipeline interrompido - instale as dependências primeiro")
         sys.exit(1)
     
-    # Pipeline de execução
-    steps = [
-        {
+    # Pipeline de execução (DAG: cada passo lista os passos de que depende)
+    steps = {
+        'dados': {
             'description': 'Passo 1: Geração de Dados Sintéticos',
             'script': '01_data/synthetic_generator.py',
+            'depends': [],
             'required': True
         },
-        {
+        'etl': {
             'description': 'Passo 2: Pipeline ETL',
             'script': '02_etl/pipeline.py',
+            'depends': ['dados'],
             'required': True
         },
-        {
+        'ml': {
             'description': 'Passo 3: Treinamento de Modelos ML',
             'script': '03_ml/models_training.py',
+            'depends': ['etl'],
             'required': False  # Opcional se Prophet não estiver instalado
         }
-    ]
+    }
     
     # Executar passos
-    success_count = 0
-    
-    for i, step in enumerate(steps, 1):
-        print_header(f"{step['description']}")
-        
-        if run_step(step['description'], step['script']):
-            success_count += 1
-        elif step['required']:
-            print("\n❌ Pipeline interrompido devido a erro crítico")
-            sys.exit(1)
-        else:
-            print("\n⚠️  Passo opcional falhou - continuando...")
+    success_count = run_steps(steps)
     
     # Resumo final
     end_time = datetime.now()
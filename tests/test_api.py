@@ -4,13 +4,15 @@ Testes para API REST - Sistema BI Varejo
 
 import pytest
 from fastapi.testclient import TestClient
+from datetime import date
+import polars as pl
 import sys
 import os
 
 # Adicionar diretório da API ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '05_api'))
 
-from main import app
+from main import app, calcular_kpis_diarios, intervalo_dias, clientes_distintos, calcular_segmentos
 
 client = TestClient(app)
 
@@ -63,6 +65,16 @@ class TestKPIsEndpoint:
         if response.status_code == 200:
             data = response.json()
             assert "receita_total" in data
+    
+    def test_get_kpis_periodo_sem_vendas(self):
+        """Testa que um período sem vendas mantém os tipos de KPIResponse"""
+        response = client.get("/kpis?data_inicio=2030-01-01&data_fim=2030-01-31")
+        
+        if response.status_code == 200:
+            data = response.json()
+            assert data["total_vendas"] == 0
+            for campo in ["receita_total", "lucro_bruto", "margem_bruta_pct", "ticket_medio"]:
+                assert isinstance(data[campo], float)
 
 
 class TestVendasEndpoints:
@@ -91,6 +103,18 @@ class TestVendasEndpoints:
             data = response.json()
             assert len(data) <= 5
 
+    def test_get_vendas_diarias_gzip(self):
+        """Testa compressão gzip das vendas diárias"""
+        response = client.get(
+            "/vendas/diarias?data_inicio=2024-01-01&data_fim=2024-12-31",
+            headers={"Accept-Encoding": "gzip"}
+        )
+
+        if response.status_code == 200:
+            assert isinstance(response.json(), list)
+            if len(response.content) >= 1024:
+                assert response.headers.get("content-encoding") == "gzip"
+
 
 class TestProdutosEndpoints:
     """Testes dos endpoints de produtos"""
@@ -132,6 +156,34 @@ class TestClientesEndpoints:
             assert isinstance(data, list)
 
 
+class TestAdminEndpoints:
+    """Testes dos endpoints administrativos"""
+    
+    def test_reload_data(self):
+        """Testa recarga dos dados em memória"""
+        response = client.post("/admin/reload")
+        
+        # Pode falhar se dados não existirem
+        assert response.status_code in [200, 500]
+        if response.status_code == 200:
+            assert response.json()["status"] == "reloaded"
+    
+    def test_kpis_after_reload(self):
+        """Testa que os KPIs em cache continuam consistentes após a recarga"""
+        antes = client.get("/kpis")
+        client.post("/admin/reload")
+        depois = client.get("/kpis")
+
+        assert depois.status_code == antes.status_code
+        if depois.status_code == 200:
+            assert depois.json() == antes.json()
+
+    def test_reload_requires_post(self):
+        """Testa que a recarga não é exposta via GET"""
+        response = client.get("/admin/reload")
+        assert response.status_code == 405
+
+
 class TestErrorHandling:
     """Testes de tratamento de erros"""
     
@@ -143,8 +195,107 @@ class TestErrorHandling:
     def test_invalid_date_format(self):
         """Testa formato de data inválido"""
         response = client.get("/kpis?data_inicio=data-invalida")
-        # Pode retornar 500 ou processar normalmente dependendo da validação
-        assert response.status_code in [200, 422, 500]
+        # Datas são validadas pelo FastAPI antes de chegar aos dados
+        assert response.status_code == 422
+    
+    def test_invalid_date_vendas_diarias(self):
+        """Testa data inexistente nas vendas diárias"""
+        response = client.get("/vendas/diarias?data_inicio=2024-13-01&data_fim=2024-12-31")
+        assert response.status_code == 422
+
+
+class TestKPIsDiarios:
+    """Testes dos acumulados diários usados por /kpis e /vendas/diarias (sem arquivos)"""
+    
+    def test_acumulados_com_zero_inicial(self, fato_exemplo):
+        """Testa que os acumulados começam em zero e seguem a ordem das datas"""
+        kpis = calcular_kpis_diarios(fato_exemplo)
+        
+        assert list(kpis['Vendas']) == [0, 2, 3, 5]
+        assert kpis['Receita'][0] == 0
+        assert kpis['Receita'][-1] == pytest.approx(fato_exemplo['Receita_Liquida'].sum())
+        assert kpis['diario']['Data'].to_list() == ['2024-01-01', '2024-01-03', '2024-01-05']
+    
+    def test_intervalo_inclui_data_fim(self, fato_exemplo):
+        """Testa que um período de um único dia inclui as vendas da data final"""
+        kpis = calcular_kpis_diarios(fato_exemplo)
+        inicio, fim = intervalo_dias(kpis['datas'], date(2024, 1, 3), date(2024, 1, 3))
+        
+        assert (inicio, fim) == (1, 2)
+        assert kpis['Receita'][fim] - kpis['Receita'][inicio] == pytest.approx(30.0)
+        assert kpis['Vendas'][fim] - kpis['Vendas'][inicio] == 1
+    
+    def test_intervalo_limites_fora_dos_dados(self, fato_exemplo):
+        """Testa datas entre dias com venda e além do último dia"""
+        datas = calcular_kpis_diarios(fato_exemplo)['datas']
+        
+        assert intervalo_dias(datas, date(2024, 1, 2), date(2024, 1, 4)) == (1, 2)
+        assert intervalo_dias(datas, date(2024, 1, 4), date(2024, 12, 31)) == (2, 3)
+        assert intervalo_dias(datas) == (0, 3)
+        assert intervalo_dias(datas, data_fim=date(2024, 1, 1)) == (0, 1)
+    
+    def test_intervalo_vazio_ou_invertido(self, fato_exemplo):
+        """Testa que períodos sem dias ou com início após o fim resultam em fatia vazia"""
+        datas = calcular_kpis_diarios(fato_exemplo)['datas']
+        
+        assert intervalo_dias(datas, date(2024, 1, 4), date(2024, 1, 4)) == (2, 2)
+        assert intervalo_dias(datas, date(2024, 2, 1), date(2024, 3, 1)) == (3, 3)
+        assert intervalo_dias(datas, date(2024, 1, 5), date(2024, 1, 1)) == (2, 2)
+
+
+class TestClientesDistintos:
+    """Testes da contagem de clientes distintos por período (sem arquivos)"""
+    
+    def test_cliente_repetido_em_varios_dias(self, fato_exemplo):
+        """Testa que um cliente com compras em dias diferentes é contado uma vez"""
+        kpis = calcular_kpis_diarios(fato_exemplo)
+        
+        # Por dia: {1, 2}, {2} e {2, 3}; a soma diária (5) não é o total distinto
+        assert list(kpis['Num_Clientes']) == [0, 2, 3, 5]
+        assert clientes_distintos(kpis, 0, 3) == 3
+        assert kpis['total_clientes'] == 3
+    
+    def test_fatia_de_dias(self, fato_exemplo):
+        """Testa os deslocamentos dos IDs de cada dia dentro do período"""
+        kpis = calcular_kpis_diarios(fato_exemplo)
+        
+        assert clientes_distintos(kpis, 0, 1) == 2
+        assert clientes_distintos(kpis, 1, 2) == 1
+        assert clientes_distintos(kpis, 1, 3) == 2
+    
+    def test_periodo_vazio(self, fato_exemplo):
+        """Testa que um período sem dias não tem clientes"""
+        kpis = calcular_kpis_diarios(fato_exemplo)
+        inicio, fim = intervalo_dias(kpis['datas'], date(2024, 1, 5), date(2024, 1, 1))
+        
+        assert clientes_distintos(kpis, inicio, fim) == 0
+
+
+class TestSegmentos:
+    """Testes das estatísticas por segmento RFM (sem arquivos)"""
+    
+    def test_medias_por_segmento(self, fato_exemplo, rfm_exemplo):
+        """Testa o alinhamento do RFM com os clientes e as médias de cada segmento"""
+        segmentos = {s['segmento']: s for s in calcular_segmentos(fato_exemplo, rfm_exemplo).to_dicts()}
+        
+        # Campeões: clientes 3 (50.0, 1 venda) e 1 (10.0, 1 venda); Leais: cliente 2 (90.0, 3 vendas)
+        assert segmentos['Campeões']['qtd_clientes'] == 2
+        assert segmentos['Campeões']['receita_media'] == pytest.approx(30.0)
+        assert segmentos['Campeões']['frequencia_media'] == pytest.approx(1.0)
+        assert segmentos['Leais']['receita_media'] == pytest.approx(90.0)
+        assert segmentos['Leais']['frequencia_media'] == pytest.approx(3.0)
+    
+    def test_cliente_sem_venda(self, fato_exemplo, rfm_exemplo):
+        """Testa que clientes do RFM sem vendas na fato ficam de fora"""
+        segmentos = calcular_segmentos(fato_exemplo, rfm_exemplo)
+        
+        assert 'Perdidos' not in segmentos['segmento'].to_list()
+        assert segmentos['qtd_clientes'].sum() == 3
+    
+    def test_sem_segmentacao(self, fato_exemplo):
+        """Testa que sem a coluna Segmento_RFM não há segmentos"""
+        rfm = pl.DataFrame({'ID_Cliente': [1, 2, 3]}, schema_overrides={'ID_Cliente': pl.Int32})
+        assert calcular_segmentos(fato_exemplo, rfm) is None
 
 
 # ==================== FIXTURES ====================
@@ -162,6 +313,29 @@ def sample_kpi_response():
     }
 
 
+@pytest.fixture
+def fato_exemplo():
+    """Fixture com uma fato pequena: três dias com venda (01, 03 e 05/01/2024), fora de ordem"""
+    return pl.DataFrame({
+        'Data_Venda': [date(2024, 1, 3), date(2024, 1, 1), date(2024, 1, 5), date(2024, 1, 1), date(2024, 1, 5)],
+        'ID_Venda': [3, 1, 4, 2, 5],
+        'ID_Cliente': [2, 1, 3, 2, 2],
+        'ID_Produto': [10, 10, 20, 20, 10],
+        'Quantidade': [1, 2, 1, 1, 3],
+        'Receita_Liquida': [30.0, 10.0, 50.0, 20.0, 40.0],
+        'Lucro_Bruto': [12.0, 4.0, 20.0, 8.0, 16.0],
+    }, schema_overrides={'ID_Cliente': pl.Int32, 'ID_Produto': pl.Int32, 'Quantidade': pl.Int32})
+
+
+@pytest.fixture
+def rfm_exemplo():
+    """Fixture com o RFM da fato de exemplo, fora de ordem; os clientes 0 e 4 não têm vendas"""
+    return pl.DataFrame({
+        'ID_Cliente': [3, 4, 1, 0, 2],
+        'Segmento_RFM': ['Campeões', 'Perdidos', 'Campeões', 'Perdidos', 'Leais'],
+    }, schema_overrides={'ID_Cliente': pl.Int32, 'Segmento_RFM': pl.Categorical})
+
+
 # ==================== EXECUTAR TESTES ====================
 
 if __name__ == "__main__":